@@ -0,0 +1,78 @@
+import base64
+import os
+import urllib.error
+import urllib.request
+from functools import cached_property
+
+from mutagen.flac import Picture
+from mutagen.id3 import APIC, PictureType
+
+
+COVER_ART_URL = os.environ.get("CDRIP_COVER_ART_URL", "https://coverartarchive.org")
+COVER_SIZE = 500  # Cover Art Archive thumbnail size: 250, 500 or 1200
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "cdrip", "covers")
+
+
+def fetch_cover_art(release_id, base_url=None, cache_dir=None):
+    """Return front cover JPEG bytes for a MusicBrainz release, or None if it has none.
+
+    Images are cached on disk by release ID, so each release is fetched once.
+    base_url can point at any Cover Art Archive-compatible server.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    cache_path = os.path.join(cache_dir, f"{release_id}-{COVER_SIZE}.jpg")
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as file:
+            return file.read()
+
+    url = f"{base_url or COVER_ART_URL}/release/{release_id}/front-{COVER_SIZE}"
+    headers = {"User-Agent": "cdrip/0.1 (https://github.com/lagerratrobe/cdrip)"}
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        response = urllib.request.urlopen(req, timeout=30)
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+    data = response.read()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, cache_path)
+    return data
+
+
+class CoverArt:
+    """A front cover image, prepared once and embedded into every track.
+
+    The per-format picture objects are all built from the same image buffer
+    and shared by every track of the album.
+    """
+
+    def __init__(self, data, mime="image/jpeg"):
+        self.data = data
+        self.mime = mime
+
+    @cached_property
+    def picture(self):
+        """FLAC PICTURE block."""
+        picture = Picture()
+        picture.type = PictureType.COVER_FRONT
+        picture.mime = self.mime
+        picture.desc = "Front cover"
+        picture.data = self.data
+        return picture
+
+    @cached_property
+    def vorbis_block(self):
+        """Base64 METADATA_BLOCK_PICTURE comment for Ogg formats."""
+        return base64.b64encode(self.picture.write()).decode("ascii")
+
+    @cached_property
+    def apic(self):
+        """ID3 APIC frame."""
+        return APIC(encoding=3, mime=self.mime, type=PictureType.COVER_FRONT,
+                    desc="Front cover", data=self.data)
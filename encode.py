@@ -1,10 +1,19 @@
+import os
+import struct
 import subprocess
-from mutagen.flac import FLAC
+import tempfile
+from governor import ResourceGovernor
+from profiles import PROFILES
+from replaygain import TrackAnalyzer
 from text_utils import clean, title_case, is_compilation, parse_compilation_track
 
 
 BOGUS_GENRES = {'data', 'other'}
 
+PCM_CHUNK_FRAMES = 65536
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
 GENRES = [
     'Rock', 'Pop', 'Alternative', 'Metal', 'Punk',
     'Hip-Hop', 'R&B / Soul', 'Funk', 'Jazz', 'Blues',
@@ -124,6 +133,11 @@ def prompt_genre(gnudb_genre):
         print(f"Enter a number from 1 to {len(GENRES)}")
 
 
+def format_cdtoc(offsets, total_sectors):
+    """Format a disc TOC as a CDTOC tag: track count, offsets and lead-out in hex."""
+    return "+".join(f"{value:X}" for value in [len(offsets), *offsets, total_sectors])
+
+
 def build_track_metadata(disc_data, track_index, genre):
     """Build metadata dict for track at given index (0-based)."""
     artist = title_case(clean(disc_data['artist']))
@@ -141,6 +155,10 @@ def build_track_metadata(disc_data, track_index, genre):
         track_artist = artist
         title = title_case(clean(tracks[track_index]))
 
+    cdtoc = ""
+    if disc_data.get('offsets') and disc_data.get('total_sectors'):
+        cdtoc = format_cdtoc(disc_data['offsets'], disc_data['total_sectors'])
+
     return {
         "title": title,
         "artist": track_artist,
@@ -149,15 +167,138 @@ def build_track_metadata(disc_data, track_index, genre):
         "date": year,
         "genre": genre,
         "tracknumber": str(track_index + 1),
-        "totaltracks": str(len(tracks))}
-
-
-def encode_track(wav_file, flac_file, metadata):
-    """Encode WAV to FLAC and apply metadata tags."""
-    subprocess.run(["flac", "--best", "-o", flac_file, wav_file],
-                   check=True, capture_output=True)
-    audio = FLAC(flac_file)
-    for key, value in metadata.items():
-        if value:
-            audio[key] = value
-    audio.save()
+        "totaltracks": str(len(tracks)),
+        "freedb_id": disc_data.get('freedb_id', ''),
+        "musicbrainz_discid": disc_data.get('musicbrainz_id', ''),
+        "cdtoc": cdtoc}
+
+
+class WavReader:
+    """Reads PCM from WAV files, including the WAVE_FORMAT_EXTENSIBLE ones `wave` rejects."""
+
+    def __init__(self, wav_file):
+        self._file = open(wav_file, "rb")
+        try:
+            self._read_header(wav_file)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _read_header(self, wav_file):
+        header = self._file.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:] != b"WAVE":
+            raise ValueError(f"Not a WAV file: {wav_file}")
+        fmt = None
+        while True:
+            header = self._file.read(8)
+            if len(header) < 8:
+                raise ValueError(f"No data chunk in {wav_file}")
+            chunk_id, size = struct.unpack("<4sI", header)
+            if chunk_id == b"data" and fmt:
+                break
+            if chunk_id == b"fmt ":
+                fmt = self._file.read(size)
+            else:
+                self._file.seek(size, os.SEEK_CUR)
+            self._file.seek(size % 2, os.SEEK_CUR)  # chunks are word aligned
+        format_tag, channels, sample_rate, _, block_align, _ = struct.unpack("<HHIIHH", fmt[:16])
+        if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            format_tag = struct.unpack("<H", fmt[24:26])[0]  # first field of the SubFormat GUID
+        if format_tag != WAVE_FORMAT_PCM:
+            raise ValueError(f"Unsupported WAV format {format_tag:#06x} in {wav_file} (need PCM)")
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.sample_width = block_align // channels
+        self.data_bytes = size - size % block_align
+        self._remaining = self.data_bytes
+
+    def readframes(self, count):
+        data = self._file.read(min(count * self.channels * self.sample_width, self._remaining))
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def remove_outputs(outputs):
+    """Delete any partial files left by failed encoders."""
+    for _, output_file in outputs:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+
+def encode_track(wav_file, flac_file, metadata, album_gain=None, derivatives=(), cover=None,
+                 governor=None):
+    """Encode WAV to FLAC and any derivatives from one read of the PCM, then tag every output.
+
+    derivatives is a list of (Profile, output_file) pairs. If album_gain is given, the track
+    is added to it; call album_gain.write_tags() once the album is done.
+    """
+    governor = governor or ResourceGovernor()
+    outputs = [(PROFILES["flac"], flac_file), *derivatives]
+    with governor.encoders.hold(len(outputs)), WavReader(wav_file) as wav:
+        channels = wav.channels
+        sample_rate = wav.sample_rate
+        bits = wav.sample_width * 8
+        chunk_bytes = PCM_CHUNK_FRAMES * wav.sample_width * channels
+        analyzer = TrackAnalyzer(sample_rate, channels, wav.sample_width)
+        processes = []
+        try:
+            for profile, output_file in outputs:
+                command = profile.command(
+                    output_file, channels, bits, sample_rate, wav.data_bytes)
+                # stderr goes to a file so a chatty encoder can't block while we feed its stdin
+                stderr_file = tempfile.TemporaryFile()
+                try:
+                    process = subprocess.Popen(
+                        command, stdin=subprocess.PIPE,
+                        stdout=subprocess.DEVNULL, stderr=stderr_file)
+                except BaseException:
+                    stderr_file.close()
+                    raise
+                processes.append((command, process, stderr_file))
+            while True:
+                with governor.memory.hold(chunk_bytes):
+                    pcm = wav.readframes(PCM_CHUNK_FRAMES)
+                    if not pcm:
+                        break
+                    for _, process, _ in processes:
+                        try:
+                            process.stdin.write(pcm)
+                        except BrokenPipeError:
+                            pass
+                    analyzer.add(pcm)
+        except BaseException:
+            for _, process, _ in processes:
+                process.kill()
+            raise
+        finally:
+            for _, process, _ in processes:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+            results = []
+            for command, process, stderr_file in processes:
+                returncode = process.wait()
+                stderr_file.seek(0)
+                results.append((command, stderr_file.read(), returncode))
+                stderr_file.close()
+            if len(results) < len(outputs) or any(returncode for _, _, returncode in results):
+                remove_outputs(outputs)
+    for command, stderr, returncode in results:
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, command, stderr=stderr)
+
+    tags = {**metadata, **analyzer.tags()}
+    for profile, output_file in outputs:
+        profile.tag_file(output_file, tags, cover)
+    if album_gain:
+        album_gain.add_track(analyzer, outputs)
@@ -1,9 +1,15 @@
 import json
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
-from rip_cd import generate_filenames
-from encode import prompt_genre, build_track_metadata, encode_track
+from rip_cd import (album_outputs, track_derivatives, CoverFetch, encode_queued_track,
+                    check_encode_jobs)
+from profiles import DERIVATIVE_PROFILES, missing_encoders
+from encode import prompt_genre, build_track_metadata
+from staging import Mover
+from replaygain import AlbumGain
+from governor import ResourceGovernor
 
 
 def find_wav_tracks(wav_folder):
@@ -31,6 +37,7 @@ def init_metadata(wav_folder):
         "album": "",
         "year": "",
         "genre": "",
+        "musicbrainz_release_id": "",
         "tracks": track_names}
 
     metadata_path = os.path.join(wav_folder, "disc_metadata.json")
@@ -42,8 +49,13 @@ def init_metadata(wav_folder):
     print("Edit the file to fill in artist, album, year, genre, and track titles.")
 
 
-def encode_folder(wav_folder, output_dir):
+def encode_folder(wav_folder, output_dir, mover=None, profiles=(), governor=None):
     """Encode wav folder to flac using metadata from disc_metadata.json."""
+    missing = missing_encoders(profiles)
+    if missing:
+        print(f"Missing encoder(s): {', '.join(missing)}")
+        return
+
     metadata_path = os.path.join(wav_folder, "disc_metadata.json")
     with open(metadata_path) as file:
         disc_data = json.load(file)
@@ -53,20 +65,39 @@ def encode_folder(wav_folder, output_dir):
         print(f"Mismatch: {len(wav_tracks)} wav files vs {len(disc_data['tracks'])} tracks in metadata")
         return
 
+    cover_fetch = CoverFetch(disc_data.get('musicbrainz_id', ''),
+                             disc_data.get('musicbrainz_release_id', ''))
     chosen_genre = prompt_genre(disc_data['genre'])
-    folder, track_filenames = generate_filenames(disc_data)
-    album_dir = os.path.join(output_dir, folder)
-    os.makedirs(album_dir, exist_ok=True)
+    outputs = album_outputs(disc_data, output_dir, profiles, mover)
+    _, folder, album_dir, track_filenames = outputs[0]
 
     num_tracks = len(wav_tracks)
-    for index, (track_num, wav_name) in enumerate(wav_tracks):
-        wav_path = os.path.join(wav_folder, wav_name)
-        flac_path = os.path.join(album_dir, track_filenames[index])
-        print(f"[{index + 1}/{num_tracks}] {track_filenames[index]}")
-        metadata = build_track_metadata(disc_data, index, chosen_genre)
-        encode_track(wav_path, flac_path, metadata)
-
-    print(f"\nDone: {album_dir}")
+    governor = governor or ResourceGovernor()
+    album_gain = AlbumGain()
+    with ThreadPoolExecutor(max_workers=governor.encoders.limit) as pool:
+        jobs = []
+        for index, (track_num, wav_name) in enumerate(wav_tracks):
+            check_encode_jobs(jobs)
+            wav_path = os.path.join(wav_folder, wav_name)
+            if mover:
+                mover.wait_for_space(os.path.getsize(wav_path))
+            flac_path = os.path.join(album_dir, track_filenames[index])
+            print(f"[{index + 1}/{num_tracks}] {track_filenames[index]}")
+            metadata = build_track_metadata(disc_data, index, chosen_genre)
+            governor.queued_tracks.acquire()
+            jobs.append(pool.submit(
+                encode_queued_track, governor, wav_path, flac_path, metadata, album_gain,
+                track_derivatives(outputs, index), cover_fetch))
+        check_encode_jobs(jobs, wait=True)
+    album_gain.write_tags()
+
+    if mover:
+        for _, folder, _, _ in outputs:
+            mover.submit(folder, output_dir)
+        print(f"\nDone: {album_dir} (moving to {output_dir})")
+    else:
+        print(f"\nDone: {album_dir}")
+    governor.print_summary()
 
 
 if __name__ == "__main__":
@@ -85,8 +116,35 @@ if __name__ == "__main__":
     encode_parser.add_argument(
         "output_dir", nargs="?", default=".",
         help="directory to write album folder into (default: current directory)")
+    encode_parser.add_argument(
+        "--staging-dir",
+        help="encode on this local directory, then move the album to output_dir")
+    encode_parser.add_argument(
+        "--staging-max-mb", type=int,
+        help="pause encoding while the staging directory is larger than this")
+    encode_parser.add_argument(
+        "--profile", action="append", default=[], choices=DERIVATIVE_PROFILES,
+        help="also encode this format from the same read (repeatable)")
+    encode_parser.add_argument(
+        "--max-memory-mb", type=int,
+        help="cap PCM held in memory by encode workers")
+    encode_parser.add_argument(
+        "--max-encoders", type=int,
+        help="encoder processes to run at once (default: one per CPU)")
     args = parser.parse_args()
     if args.command == "init":
         init_metadata(args.wav_folder)
     elif args.command == "encode":
-        encode_folder(args.wav_folder, args.output_dir)
+        governor = ResourceGovernor(
+            args.max_memory_mb * 1024 * 1024 if args.max_memory_mb else None,
+            max_encoders=args.max_encoders)
+        mover = None
+        if args.staging_dir:
+            max_bytes = args.staging_max_mb * 1024 * 1024 if args.staging_max_mb else None
+            mover = Mover(args.staging_dir, max_bytes)
+        try:
+            encode_folder(args.wav_folder, args.output_dir, mover=mover, profiles=args.profile,
+                          governor=governor)
+        finally:
+            if mover:
+                mover.close()
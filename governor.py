@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Budget:
+    """A counted resource with an optional cap that producers block on.
+
+    acquire() waits while taking amount would exceed limit. A single request
+    larger than the whole limit is let through when nothing else is held, so
+    an undersized cap slows the pipeline down rather than deadlocking it.
+    With no limit, a Budget is just a gauge of current depth and high water.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.in_use = 0
+        self.high_water = 0
+        self.waits = 0
+        self.blocked_seconds = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount=1):
+        with self._cond:
+            if self._over_limit(amount):
+                self.waits += 1
+                start = time.monotonic()
+                while self._over_limit(amount):
+                    self._cond.wait()
+                self.blocked_seconds += time.monotonic() - start
+            self.in_use += amount
+            self.high_water = max(self.high_water, self.in_use)
+
+    def release(self, amount=1):
+        with self._cond:
+            self.in_use -= amount
+            self._cond.notify_all()
+
+    @contextmanager
+    def hold(self, amount=1):
+        self.acquire(amount)
+        try:
+            yield
+        finally:
+            self.release(amount)
+
+    def _over_limit(self, amount):
+        return self.limit is not None and self.in_use and self.in_use + amount > self.limit
+
+    def summary(self):
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "high_water": self.high_water,
+            "waits": self.waits,
+            "blocked_seconds": round(self.blocked_seconds, 3)}
+
+
+class ResourceGovernor:
+    """Caps what can pile up between ripping and encoding.
+
+    memory: bytes of PCM held in memory by encode workers.
+    spool: bytes of temp WAVs on disk waiting to be encoded.
+    encoders: encoder processes (flac and derivatives) running at once.
+    queued_tracks: uncapped gauge of tracks waiting for an encode worker.
+    """
+
+    def __init__(self, max_memory_bytes=None, max_spool_bytes=None, max_encoders=None):
+        self.memory = Budget(max_memory_bytes)
+        self.spool = Budget(max_spool_bytes)
+        self.encoders = Budget(max_encoders or os.cpu_count())
+        self.queued_tracks = Budget()
+
+    def summary(self):
+        return {
+            "memory_bytes": self.memory.summary(),
+            "spool_bytes": self.spool.summary(),
+            "encoders": self.encoders.summary(),
+            "queued_tracks": self.queued_tracks.summary()}
+
+    def print_summary(self):
+        print("\nResource usage (high water / cap, times blocked):")
+        for name, stats in self.summary().items():
+            limit = stats["limit"] if stats["limit"] is not None else "none"
+            print(f"  {name:<14} {stats['high_water']} / {limit}, "
+                  f"blocked {stats['waits']}x for {stats['blocked_seconds']}s")
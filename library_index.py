@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+from mutagen.flac import FLAC
+
+
+INDEX_NAME = ".cdrip_index.json"
+PARALLEL_THRESHOLD = 64
+
+
+def find_flac_files(library_dir):
+    """Walk library_dir, yielding (relative_path, size, mtime_ns) for each FLAC.
+
+    Hidden folders (such as staging `.partial` folders) are skipped.
+    """
+    for root, dirs, files in os.walk(library_dir):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for name in files:
+            if not name.lower().endswith(".flac"):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            yield os.path.relpath(path, library_dir), stat.st_size, stat.st_mtime_ns
+
+
+def read_flac_entry(path):
+    """Read disc identifiers, track number and STREAMINFO audio MD5 from a FLAC."""
+    audio = FLAC(path)
+
+    def tag(key):
+        values = audio.get(key)
+        return values[0] if values else ""
+
+    return {
+        "freedb_id": tag("freedb_id"),
+        "musicbrainz_discid": tag("musicbrainz_discid"),
+        "cdtoc": tag("cdtoc"),
+        "tracknumber": tag("tracknumber"),
+        "md5": f"{audio.info.md5_signature:032x}"}
+
+
+def _read_entry(path):
+    try:
+        return read_flac_entry(path)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def load_index(index_path):
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path) as file:
+        return json.load(file)
+
+
+def save_index(index, index_path):
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(index, file)
+    os.replace(tmp_path, index_path)
+
+
+def update_index(library_dir, index_path=None, workers=None):
+    """Build or refresh the library index and return it.
+
+    The index maps each FLAC's path (relative to library_dir) to its size,
+    mtime, album folder, disc identifiers and audio MD5. Only files that are
+    new or whose size or mtime changed are re-read; large batches are read
+    across a process pool.
+    """
+    if index_path is None:
+        index_path = os.path.join(library_dir, INDEX_NAME)
+    old_index = load_index(index_path)
+
+    index = {}
+    stale = []
+    for rel_path, size, mtime in find_flac_files(library_dir):
+        entry = old_index.get(rel_path)
+        if entry and entry["size"] == size and entry["mtime"] == mtime:
+            index[rel_path] = entry
+        else:
+            stale.append((rel_path, size, mtime))
+
+    paths = [os.path.join(library_dir, rel_path) for rel_path, _, _ in stale]
+    if len(paths) >= PARALLEL_THRESHOLD:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            entries = list(pool.map(_read_entry, paths, chunksize=32))
+    else:
+        entries = [_read_entry(path) for path in paths]
+
+    for (rel_path, size, mtime), entry in zip(stale, entries):
+        entry.update({
+            "size": size,
+            "mtime": mtime,
+            "album": os.path.dirname(rel_path)})
+        index[rel_path] = entry
+
+    if stale or len(index) != len(old_index):
+        save_index(index, index_path)
+    return index
+
+
+def find_disc(index, freedb_id=None, musicbrainz_id=None):
+    """Find indexed albums ripped from this disc.
+
+    Matches on MusicBrainz disc ID, falling back to freedb ID. Returns
+    {album_folder: {tracknumber: md5}}, empty if the disc isn't in the library.
+    """
+    albums = {}
+    for entry in index.values():
+        if musicbrainz_id and entry.get("musicbrainz_discid"):
+            matched = entry["musicbrainz_discid"] == musicbrainz_id
+        else:
+            matched = bool(freedb_id) and entry.get("freedb_id") == freedb_id
+        if matched:
+            albums.setdefault(entry["album"], {})[entry["tracknumber"]] = entry["md5"]
+    return albums
+
+
+def wav_md5(wav_file):
+    """MD5 of a WAV's PCM data, comparable to a FLAC's STREAMINFO MD5 for 16-bit audio."""
+    digest = hashlib.md5()
+    with wave.open(wav_file, "rb") as wav:
+        while True:
+            frames = wav.readframes(65536)
+            if not frames:
+                break
+            digest.update(frames)
+    return digest.hexdigest()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Build or refresh the disc index for a FLAC library.")
+    parser.add_argument("library_dir", help="root of the music library")
+    parser.add_argument(
+        "--workers", type=int,
+        help="processes to use when reading many files (default: one per CPU)")
+    args = parser.parse_args()
+    index = update_index(args.library_dir, workers=args.workers)
+    albums = {entry["album"] for entry in index.values()}
+    print(f"Indexed {len(index)} files in {len(albums)} albums")
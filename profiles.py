@@ -0,0 +1,139 @@
+import shutil
+
+from mutagen.easyid3 import EasyID3, EasyID3KeyError
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3NoHeaderError
+from mutagen.oggopus import OggOpus
+from replaygain import REFERENCE_LOUDNESS
+
+
+EasyID3.RegisterTXXXKey("freedb_id", "FREEDB_ID")
+EasyID3.RegisterTXXXKey("cdtoc", "CDTOC")
+for scope in ("track", "album"):
+    for field in ("gain", "peak"):
+        # TXXX frames, which players read, rather than EasyID3's default RVA2
+        EasyID3.RegisterTXXXKey(f"replaygain_{scope}_{field}", f"REPLAYGAIN_{scope}_{field}".upper())
+EasyID3.RegisterKey(
+    "cover",
+    getter=lambda id3, key: [frame.desc for frame in id3.getall("APIC")],
+    setter=lambda id3, key, frames: id3.setall("APIC", frames),
+    deleter=lambda id3, key: id3.delall("APIC"))
+
+R128_REFERENCE_LOUDNESS = -23.0  # RFC 7845 gain reference, LUFS
+
+
+class Profile:
+    """An output format: file extension, encoder command and tagger.
+
+    command(output_file, channels, bits, sample_rate, input_size) returns the
+    argv of an encoder that reads input_size bytes of raw little-endian signed
+    PCM on stdin.
+    tag_file(output_file, tags, cover=None) writes a metadata dict, and the
+    front cover if a CoverArt is given, into the encoded file.
+    binary is the encoder executable, checked by missing_encoders().
+    """
+
+    def __init__(self, name, extension, command, tag_file, binary=None):
+        self.name = name
+        self.extension = extension
+        self.command = command
+        self.tag_file = tag_file
+        self.binary = binary
+
+
+def flac_command(output_file, channels, bits, sample_rate, input_size):
+    return [
+        "flac", "--best", "--silent", "--force-raw-format",
+        "--endian=little", "--sign=signed",
+        f"--channels={channels}", f"--bps={bits}",
+        f"--sample-rate={sample_rate}",
+        f"--input-size={input_size}",  # lets flac place its seek points
+        "-o", output_file, "-"]
+
+
+def opus_command(output_file, channels, bits, sample_rate, input_size):
+    return [
+        "opusenc", "--quiet", "--bitrate", "128",
+        "--raw", f"--raw-bits={bits}", f"--raw-rate={sample_rate}", f"--raw-chan={channels}",
+        "-", output_file]
+
+
+def mp3_command(output_file, channels, bits, sample_rate, input_size):
+    return [
+        "lame", "--quiet", "-V", "2",
+        "-r", "-s", f"{sample_rate / 1000:g}", "--bitwidth", str(bits),
+        "--signed", "--little-endian", "-m", "j" if channels == 2 else "m",
+        "-", output_file]
+
+
+def set_tags(audio, tags):
+    for key, value in tags.items():
+        if value:
+            audio[key] = value
+
+
+def tag_flac(output_file, tags, cover=None):
+    audio = FLAC(output_file)
+    set_tags(audio, tags)
+    if cover:
+        audio.clear_pictures()
+        audio.add_picture(cover.picture)
+    audio.save()
+
+
+def r128_tags(tags):
+    """Replace ReplayGain tags with Opus R128_*_GAIN tags (Q7.8 dB relative to -23 LUFS)."""
+    tags = dict(tags)
+    for scope in ("track", "album"):
+        gain = tags.pop(f"replaygain_{scope}_gain", "")
+        tags.pop(f"replaygain_{scope}_peak", None)
+        if gain:
+            db = float(gain.split()[0]) + R128_REFERENCE_LOUDNESS - REFERENCE_LOUDNESS
+            tags[f"r128_{scope}_gain"] = str(max(-32768, min(32767, round(db * 256))))
+    return tags
+
+
+def tag_opus(output_file, tags, cover=None):
+    audio = OggOpus(output_file)
+    set_tags(audio, r128_tags(tags))
+    if cover:
+        audio["metadata_block_picture"] = [cover.vorbis_block]
+    audio.save()
+
+
+def tag_mp3(output_file, tags, cover=None):
+    """Write tags as ID3, folding totaltracks into tracknumber as 'N/total'.
+
+    Keys with no ID3 mapping are skipped.
+    """
+    tags = dict(tags)
+    total = tags.pop("totaltracks", "")
+    if total and tags.get("tracknumber"):
+        tags["tracknumber"] = f"{tags['tracknumber']}/{total}"
+    try:
+        audio = EasyID3(output_file)
+    except ID3NoHeaderError:
+        audio = EasyID3()
+    for key, value in tags.items():
+        if value:
+            try:
+                audio[key] = value
+            except EasyID3KeyError:
+                pass
+    if cover:
+        audio["cover"] = [cover.apic]
+    audio.save(output_file)
+
+
+PROFILES = {
+    "flac": Profile("flac", "flac", flac_command, tag_flac, "flac"),
+    "opus": Profile("opus", "opus", opus_command, tag_opus, "opusenc"),
+    "mp3": Profile("mp3", "mp3", mp3_command, tag_mp3, "lame")}
+
+DERIVATIVE_PROFILES = [name for name in PROFILES if name != "flac"]
+
+
+def missing_encoders(profiles=()):
+    """Encoder executables needed for FLAC plus the named profiles that aren't on PATH."""
+    binaries = [PROFILES[name].binary for name in ["flac", *profiles]]
+    return [binary for binary in binaries if binary and not shutil.which(binary)]
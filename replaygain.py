@@ -0,0 +1,149 @@
+import math
+import threading
+
+import numpy as np
+
+
+REFERENCE_LOUDNESS = -18.0  # ReplayGain 2.0 reference level, LUFS
+SUB_BLOCK_SECONDS = 0.1  # gating blocks are 4 sub-blocks: 400 ms with 75% overlap
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+
+def k_weighting_power(sample_rate, block_size):
+    """Power response of the BS.1770 K-weighting filter at each rfft bin of a block.
+
+    Includes the Parseval factors so that summing weighted |X|^2 over the
+    rfft bins gives the block's weighted mean square.
+    """
+    # Shelving stage, coefficients derived for any sample rate as in libebur128
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0]
+    shelf_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # High-pass stage
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass_b = [1.0, -2.0, 1.0]
+    highpass_a = [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    z = np.exp(-2j * np.pi * np.arange(block_size // 2 + 1) / block_size)
+
+    def response(b, a):
+        return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+
+    power = np.abs(response(shelf_b, shelf_a) * response(highpass_b, highpass_a)) ** 2
+    power[1:(block_size + 1) // 2] *= 2
+    return power / block_size ** 2
+
+
+def gated_loudness(block_powers):
+    """Gated loudness in LUFS of 400 ms block powers, or None if everything is gated out."""
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(block_powers)
+        block_powers = block_powers[loudness > ABSOLUTE_GATE]
+        if not block_powers.size:
+            return None
+        threshold = -0.691 + 10 * np.log10(block_powers.mean()) + RELATIVE_GATE
+        block_powers = block_powers[-0.691 + 10 * np.log10(block_powers) > threshold]
+        return -0.691 + 10 * np.log10(block_powers.mean())
+
+
+def gain_tags(scope, block_powers, peak):
+    loudness = gated_loudness(block_powers)
+    gain = REFERENCE_LOUDNESS - loudness if loudness is not None else 0.0
+    return {
+        f"replaygain_{scope}_gain": f"{gain:.2f} dB",
+        f"replaygain_{scope}_peak": f"{peak:.6f}"}
+
+
+def decode_pcm(pcm, sample_width, channels):
+    """Decode interleaved little-endian signed PCM to floats in [-1, 1), one column per channel."""
+    if sample_width == 2:
+        samples = np.frombuffer(pcm, dtype="<i2")
+    elif sample_width == 3:
+        raw = np.frombuffer(pcm, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((raw[:, 0] | raw[:, 1] << 8 | raw[:, 2] << 16) << 8) >> 8
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width * 8}-bit (need 16 or 24)")
+    return samples.reshape(-1, channels) / float(1 << (sample_width * 8 - 1))
+
+
+class TrackAnalyzer:
+    """Measures loudness and peak of one track from chunks of interleaved 16- or 24-bit PCM.
+
+    Each chunk is split into 100 ms sub-blocks whose K-weighted power is
+    computed with one vectorized FFT; samples left over are carried into the
+    next chunk.
+    """
+
+    def __init__(self, sample_rate, channels, sample_width=2):
+        if sample_width not in (2, 3):
+            raise ValueError(f"Unsupported sample width: {sample_width * 8}-bit (need 16 or 24)")
+        self.channels = channels
+        self.sample_width = sample_width
+        self.block_size = int(sample_rate * SUB_BLOCK_SECONDS)
+        self.weights = k_weighting_power(sample_rate, self.block_size)
+        self.peak = 0.0
+        self._sub_powers = []
+        self._leftover = np.empty((0, channels))
+
+    def add(self, pcm):
+        samples = decode_pcm(pcm, self.sample_width, self.channels)
+        if not samples.size:
+            return
+        self.peak = max(self.peak, float(np.abs(samples).max()))
+        samples = np.concatenate([self._leftover, samples])
+        num_blocks = len(samples) // self.block_size
+        used = num_blocks * self.block_size
+        blocks = samples[:used].reshape(num_blocks, self.block_size, self.channels)
+        spectrum = np.fft.rfft(blocks, axis=1)
+        powers = (np.abs(spectrum) ** 2 * self.weights[:, None]).sum(axis=(1, 2))
+        self._sub_powers.append(powers)
+        self._leftover = samples[used:]
+
+    def block_powers(self):
+        """Powers of the 400 ms gating blocks seen so far."""
+        sub_powers = np.concatenate(self._sub_powers) if self._sub_powers else np.empty(0)
+        if len(sub_powers) < 4:
+            return np.array([sub_powers.mean()]) if sub_powers.size else sub_powers
+        return np.convolve(sub_powers, np.ones(4) / 4, mode="valid")
+
+    def tags(self):
+        return gain_tags("track", self.block_powers(), self.peak)
+
+
+class AlbumGain:
+    """Collects per-track analysis from encode workers and writes album gain tags.
+
+    add_track() is safe to call from several threads. Once every track of the
+    album has been added, write_tags() tags all of the album's files.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._block_powers = []
+        self._peak = 0.0
+        self._outputs = []
+
+    def add_track(self, analyzer, outputs):
+        """Add a track's analysis. outputs are the (Profile, output_file) pairs to tag."""
+        with self._lock:
+            self._block_powers.append(analyzer.block_powers())
+            self._peak = max(self._peak, analyzer.peak)
+            self._outputs.extend(outputs)
+
+    def tags(self):
+        with self._lock:
+            block_powers = np.concatenate(self._block_powers) if self._block_powers else np.empty(0)
+            return gain_tags("album", block_powers, self._peak)
+
+    def write_tags(self):
+        tags = self.tags()
+        for profile, output_file in self._outputs:
+            profile.tag_file(output_file, tags)
@@ -1,13 +1,27 @@
 import json
 import os
 import subprocess
+import tempfile
+import threading
+import time
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 
 from text_utils import clean, sanitize_filename, title_case, is_compilation, parse_compilation_track
-from scan_disc import read_disc, query_gnudb, read_gnudb, search_musicbrainz
+from scan_disc import read_disc, query_gnudb, read_gnudb, search_musicbrainz, lookup_release_id
 from encode import prompt_genre, build_track_metadata, encode_track
+from profiles import PROFILES, DERIVATIVE_PROFILES, missing_encoders
+from staging import Mover
+from replaygain import AlbumGain
+from cover_art import CoverArt, fetch_cover_art
+from governor import ResourceGovernor
+from library_index import update_index, find_disc, wav_md5
 
 
-def generate_filenames(disc_data):
+COVER_WAIT_SECONDS = 60
+
+
+def generate_filenames(disc_data, extension="flac"):
     """Generate folder name and track filenames from disc data.
 
     Returns (folder_name, [track_filenames])
@@ -31,19 +45,162 @@ def generate_filenames(disc_data):
         else:
             track_artist = artist
             title = title_case(clean(track_str))
-        filename = sanitize_filename(f"{track_artist} - {i:02d} - {title}.flac")
+        filename = sanitize_filename(f"{track_artist} - {i:02d} - {title}.{extension}")
         track_files.append(filename)
 
     return folder, track_files
 
 
+def album_outputs(disc_data, output_dir, profiles=(), mover=None):
+    """Create album folders for FLAC and each derivative profile (e.g. opus/Artist - Album).
+
+    Returns a list of (profile, relative_folder, album_dir, track_filenames), FLAC first.
+    """
+    outputs = []
+    for name in ["flac", *profiles]:
+        profile = PROFILES[name]
+        folder, track_filenames = generate_filenames(disc_data, profile.extension)
+        if name != "flac":
+            folder = os.path.join(name, folder)
+        if mover:
+            album_dir = mover.album_dir(folder)
+        else:
+            album_dir = os.path.join(output_dir, folder)
+            os.makedirs(album_dir, exist_ok=True)
+        outputs.append((profile, folder, album_dir, track_filenames))
+    return outputs
+
+
+def track_derivatives(outputs, track_index):
+    """(Profile, output_file) pairs for a track's derivative formats."""
+    return [(profile, os.path.join(album_dir, track_filenames[track_index]))
+            for profile, _, album_dir, track_filenames in outputs[1:]]
+
+
+def fetch_disc_cover(musicbrainz_id="", release_id=""):
+    """Fetch the front cover for a disc's MusicBrainz release. Returns a CoverArt or None."""
+    try:
+        if not release_id and musicbrainz_id:
+            release_id = lookup_release_id(musicbrainz_id)
+        data = fetch_cover_art(release_id) if release_id else None
+    except Exception as e:
+        print(f"\nCould not fetch cover art: {e}")
+        return None
+    return CoverArt(data) if data else None
+
+
+class CoverFetch:
+    """Fetches an album's cover in the background and resolves it once for every track.
+
+    result() waits until COVER_WAIT_SECONDS after the fetch started. Whatever it
+    gets then, a CoverArt or None, is what every later call returns.
+    """
+
+    def __init__(self, musicbrainz_id="", release_id=""):
+        self._deadline = time.monotonic() + COVER_WAIT_SECONDS
+        self._lock = threading.Lock()
+        self._resolved = False
+        self._cover = None
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._future = executor.submit(fetch_disc_cover, musicbrainz_id, release_id)
+        executor.shutdown(wait=False)
+
+    def result(self):
+        with self._lock:
+            if not self._resolved:
+                try:
+                    self._cover = self._future.result(
+                        timeout=max(0, self._deadline - time.monotonic()))
+                except concurrent.futures.TimeoutError:
+                    print("\nCover art fetch timed out; encoding without it.")
+                self._resolved = True
+            return self._cover
+
+
+def track_wav_bytes(offsets, total_sectors, track_index):
+    """Size of a track's ripped WAV, from the disc TOC."""
+    end = offsets[track_index + 1] if track_index + 1 < len(offsets) else total_sectors
+    return (end - offsets[track_index]) * 2352 + 44
+
+
+def encode_queued_track(governor, wav_path, flac_path, metadata, album_gain, derivatives,
+                        cover_fetch, spool_bytes=0):
+    """Encode worker for a track queued by rip_disc or encode_folder.
+
+    If spool_bytes is set, wav_path is a temp WAV: it is removed once encoded
+    and its space in the governor's spool is released.
+    """
+    governor.queued_tracks.release()
+    try:
+        encode_track(wav_path, flac_path, metadata, album_gain, derivatives,
+                     cover_fetch.result(), governor)
+    finally:
+        if spool_bytes and os.path.exists(wav_path):
+            os.remove(wav_path)
+        governor.spool.release(spool_bytes)
+
+
+def check_encode_jobs(jobs, wait=False):
+    """Raise the first failed encode job, cancelling any that haven't started."""
+    if wait:
+        concurrent.futures.wait(jobs, return_when=concurrent.futures.FIRST_EXCEPTION)
+    for job in jobs:
+        if job.done() and not job.cancelled() and job.exception():
+            for pending in jobs:
+                pending.cancel()
+            raise job.exception()
+
+
 def rip_track(track_number, output_file):
     subprocess.run(["cdparanoia", str(track_number), output_file], check=True)
 
 
-def rip_disc(output_dir, metadata_only=False):
+def verify_disc(num_tracks, library_md5s):
+    """Rip each track to a temp file and compare its audio MD5 with the library copy.
+
+    library_md5s maps tracknumber strings to FLAC STREAMINFO MD5s.
+    Returns the list of track numbers that don't match.
+    """
+    mismatched = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i in range(1, num_tracks + 1):
+            print(f"[{i}/{num_tracks}] Verifying...")
+            wav_path = os.path.join(tmp_dir, f"track{i:02d}.wav")
+            rip_track(i, wav_path)
+            if wav_md5(wav_path) != library_md5s.get(str(i)):
+                mismatched.append(i)
+            os.remove(wav_path)
+    return mismatched
+
+
+def rip_disc(output_dir, metadata_only=False, mover=None, profiles=(), governor=None):
+    """Rip the disc in /dev/cdrom to FLAC (plus derivative profiles) under output_dir."""
+    missing = missing_encoders(profiles)
+    if missing and not metadata_only:
+        print(f"Missing encoder(s): {', '.join(missing)}")
+        return
+
     freedb_id, musicbrainz_id, num_tracks, offsets, total_sectors = read_disc()
 
+    if not metadata_only and os.path.isdir(output_dir):
+        owned = find_disc(update_index(output_dir), freedb_id, musicbrainz_id)
+        if owned:
+            folder, library_md5s = next(iter(owned.items()))
+            print(f"\nThis disc is already in the library: {folder}")
+            choice = input("[s]kip, [v]erify against library, or [r]ip again? [s]: ").strip().lower()
+            if choice.startswith("v"):
+                mismatched = verify_disc(num_tracks, library_md5s)
+                if mismatched:
+                    print(f"\nTracks differing from library: {', '.join(map(str, mismatched))}")
+                else:
+                    print(f"\nAll {num_tracks} tracks match the library.")
+            if not choice.startswith("r"):
+                subprocess.run(["eject", "/dev/cdrom"])
+                return
+
+    if not metadata_only:
+        cover_fetch = CoverFetch(musicbrainz_id)
+
     try:
         category, gnudb_id = query_gnudb(freedb_id, num_tracks, offsets, total_sectors)
         artist, album, year, genre, tracks = read_gnudb(category, gnudb_id)
@@ -65,6 +222,7 @@ def rip_disc(output_dir, metadata_only=False):
         "genre": genre,
         "num_tracks": num_tracks,
         "offsets": offsets,
+        "total_sectors": total_sectors,
         "tracks": tracks}
 
     print(f"\n{artist} - {album} ({year}) [{genre}] — {num_tracks} tracks\n")
@@ -102,6 +260,10 @@ def rip_disc(output_dir, metadata_only=False):
                 "album": disc_data["album"],
                 "year": disc_data["year"],
                 "genre": disc_data["genre"],
+                "freedb_id": disc_data["freedb_id"],
+                "musicbrainz_id": disc_data["musicbrainz_id"],
+                "offsets": disc_data["offsets"],
+                "total_sectors": disc_data["total_sectors"],
                 "tracks": disc_data["tracks"]}, f, indent=2)
             f.write("\n")
         print(f"Wrote {metadata_path}")
@@ -109,20 +271,46 @@ def rip_disc(output_dir, metadata_only=False):
 
     chosen_genre = prompt_genre(genre)
 
-    folder, track_filenames = generate_filenames(disc_data)
-    album_dir = os.path.join(output_dir, folder)
-    os.makedirs(album_dir, exist_ok=True)
+    outputs = album_outputs(disc_data, output_dir, profiles, mover)
+    _, folder, album_dir, track_filenames = outputs[0]
 
-    for i, flac_name in enumerate(track_filenames, start=1):
-        print(f"[{i}/{num_tracks}] Ripping {tracks[i-1]}...")
-        wav_path = os.path.join(album_dir, f"track{i:02d}.wav")
-        flac_path = os.path.join(album_dir, flac_name)
-        rip_track(i, wav_path)
-        metadata = build_track_metadata(disc_data, i - 1, chosen_genre)
-        encode_track(wav_path, flac_path, metadata)
-        os.remove(wav_path)
+    governor = governor or ResourceGovernor()
+    album_gain = AlbumGain()
+    wav_paths = []
+    try:
+        with ThreadPoolExecutor(max_workers=governor.encoders.limit) as pool:
+            jobs = []
+            for i, flac_name in enumerate(track_filenames, start=1):
+                check_encode_jobs(jobs)
+                wav_bytes = track_wav_bytes(offsets, total_sectors, i - 1)
+                if mover:
+                    mover.wait_for_space(wav_bytes, draining=lambda: governor.spool.in_use > 0)
+                governor.spool.acquire(wav_bytes)
+                print(f"[{i}/{num_tracks}] Ripping {tracks[i-1]}...")
+                wav_path = os.path.join(album_dir, f"track{i:02d}.wav")
+                flac_path = os.path.join(album_dir, flac_name)
+                wav_paths.append(wav_path)
+                rip_track(i, wav_path)
+                metadata = build_track_metadata(disc_data, i - 1, chosen_genre)
+                governor.queued_tracks.acquire()
+                jobs.append(pool.submit(
+                    encode_queued_track, governor, wav_path, flac_path, metadata, album_gain,
+                    track_derivatives(outputs, i - 1), cover_fetch, wav_bytes))
+            check_encode_jobs(jobs, wait=True)
+    except BaseException:
+        for wav_path in wav_paths:
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+        raise
+    album_gain.write_tags()
 
-    print(f"\nDone: {album_dir}")
+    if mover:
+        for _, folder, _, _ in outputs:
+            mover.submit(folder, output_dir)
+        print(f"\nDone: {album_dir} (moving to {output_dir})")
+    else:
+        print(f"\nDone: {album_dir}")
+    governor.print_summary()
     subprocess.run(["eject", "/dev/cdrom"])
 
 
@@ -136,5 +324,36 @@ if __name__ == "__main__":
     parser.add_argument(
         "--metadata-only", action="store_true",
         help="fetch metadata and write disc_metadata.json without ripping")
+    parser.add_argument(
+        "--staging-dir",
+        help="rip and encode on this local directory, then move the album to output_dir")
+    parser.add_argument(
+        "--staging-max-mb", type=int,
+        help="pause ripping while the staging directory is larger than this")
+    parser.add_argument(
+        "--profile", action="append", default=[], choices=DERIVATIVE_PROFILES,
+        help="also encode this format from the same rip (repeatable)")
+    parser.add_argument(
+        "--max-memory-mb", type=int,
+        help="cap PCM held in memory by encode workers")
+    parser.add_argument(
+        "--max-spool-mb", type=int,
+        help="pause ripping while ripped WAVs waiting to be encoded exceed this")
+    parser.add_argument(
+        "--max-encoders", type=int,
+        help="encoder processes to run at once (default: one per CPU)")
     args = parser.parse_args()
-    rip_disc(args.output_dir, metadata_only=args.metadata_only)
+    governor = ResourceGovernor(
+        args.max_memory_mb * 1024 * 1024 if args.max_memory_mb else None,
+        args.max_spool_mb * 1024 * 1024 if args.max_spool_mb else None,
+        args.max_encoders)
+    mover = None
+    if args.staging_dir:
+        max_bytes = args.staging_max_mb * 1024 * 1024 if args.staging_max_mb else None
+        mover = Mover(args.staging_dir, max_bytes)
+    try:
+        rip_disc(args.output_dir, metadata_only=args.metadata_only, mover=mover,
+                 profiles=args.profile, governor=governor)
+    finally:
+        if mover:
+            mover.close()
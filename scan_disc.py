@@ -1,6 +1,7 @@
 import json
 import time
 import discid
+import urllib.error
 import urllib.request
 import urllib.parse
 
@@ -94,6 +95,30 @@ def search_musicbrainz(artist, album):
     return tracks, year
 
 
+def lookup_release_id(musicbrainz_id):
+    """Look up the MusicBrainz release for a disc ID.
+
+    Returns the release MBID, or None if the disc ID isn't in MusicBrainz.
+    """
+    base = "https://musicbrainz.org/ws/2"
+    headers = {"User-Agent": "cdrip/0.1 (https://github.com/lagerratrobe/cdrip)"}
+
+    lookup_url = f"{base}/discid/{urllib.parse.quote(musicbrainz_id)}?fmt=json"
+    req = urllib.request.Request(lookup_url, headers=headers)
+    try:
+        response = urllib.request.urlopen(req, timeout=30)
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+    data = json.loads(response.read().decode("utf-8"))
+
+    releases = data.get("releases", [])
+    if not releases:
+        return None
+    return releases[0]["id"]
+
+
 def append_to_file(data, filename="disc_data.json"):
     with open(filename, "a") as f:
         f.write(json.dumps(data, indent=2) + "\n")
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import queue
+import shutil
+import threading
+
+
+COPY_CHUNK = 8 * 1024 * 1024
+
+
+def file_checksum(path):
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while True:
+            chunk = file.read(COPY_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_file(src, dst):
+    """Copy src to dst in large sequential writes. Returns sha256 of the source data."""
+    digest = hashlib.sha256()
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        while True:
+            chunk = fin.read(COPY_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+            fout.write(chunk)
+        fout.flush()
+        os.fsync(fout.fileno())
+    return digest.hexdigest()
+
+
+def directory_size(path):
+    """Total size in bytes of all files under path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def move_album(staged_dir, final_dir):
+    """Copy a finished album from staging into the library and remove the staged copy.
+
+    Files are copied into a hidden `.<album>.partial` directory next to final_dir,
+    checked against the staged files by size and sha256, then the directory is
+    renamed into place so library scanners never see a half-written album. An
+    existing final_dir is swapped out whole and deleted.
+    """
+    parent = os.path.dirname(final_dir)
+    os.makedirs(parent, exist_ok=True)
+    partial_dir = os.path.join(parent, f".{os.path.basename(final_dir)}.partial")
+    if os.path.exists(partial_dir):
+        shutil.rmtree(partial_dir)
+    os.makedirs(partial_dir)
+
+    for name in sorted(os.listdir(staged_dir)):
+        src = os.path.join(staged_dir, name)
+        if not os.path.isfile(src):
+            continue
+        dst = os.path.join(partial_dir, name)
+        checksum = copy_file(src, dst)
+        if os.path.getsize(dst) != os.path.getsize(src):
+            raise IOError(f"Size mismatch after copying {name}")
+        if file_checksum(dst) != checksum:
+            raise IOError(f"Checksum mismatch after copying {name}")
+
+    if os.path.exists(final_dir):
+        old_dir = os.path.join(parent, f".{os.path.basename(final_dir)}.old")
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+        os.rename(final_dir, old_dir)
+        try:
+            os.rename(partial_dir, final_dir)
+        except OSError:
+            os.rename(old_dir, final_dir)
+            raise
+        shutil.rmtree(old_dir)
+    else:
+        os.rename(partial_dir, final_dir)
+    shutil.rmtree(staged_dir)
+
+
+class Mover:
+    """Background thread that moves finished albums from a local staging area to the library.
+
+    Albums are encoded and tagged under staging_dir, then handed to submit().
+    If max_bytes is set, wait_for_space() blocks producers while the staging
+    area plus the next track would go over the cap.
+    """
+
+    def __init__(self, staging_dir, max_bytes=None):
+        self.staging_dir = staging_dir
+        self.max_bytes = max_bytes
+        self.errors = []
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._cond = threading.Condition()
+        os.makedirs(staging_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def album_dir(self, folder):
+        """Create and return the staging directory for an album folder."""
+        path = os.path.join(self.staging_dir, folder)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def submit(self, folder, output_dir):
+        """Queue a finished staged album to be moved to output_dir/folder."""
+        with self._cond:
+            self._pending += 1
+        self._queue.put((folder, output_dir))
+
+    def wait_for_space(self, next_bytes=0, draining=None):
+        """Block until next_bytes more fits in the staging area under max_bytes.
+
+        Waits while queued albums or the caller's draining() work can free space;
+        when nothing can, an oversized request is let through.
+        """
+        if self.max_bytes is None:
+            return
+        with self._cond:
+            while directory_size(self.staging_dir) + next_bytes > self.max_bytes:
+                if not self._pending and not (draining and draining()):
+                    return
+                self._cond.wait(timeout=1)
+
+    def close(self):
+        """Wait for all queued albums to be moved and stop the mover thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            folder, output_dir = item
+            final_dir = os.path.join(output_dir, folder)
+            try:
+                move_album(os.path.join(self.staging_dir, folder), final_dir)
+                print(f"Moved to library: {final_dir}")
+            except Exception as e:
+                print(f"\nCould not move {folder} to library (staged copy kept): {e}")
+                self.errors.append((folder, e))
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
@@ -1,8 +1,12 @@
 import json
 import os
+import struct
 import sys
+import wave
 
+import numpy as np
 import pytest
+from mutagen.flac import FLAC
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
@@ -28,6 +32,32 @@ def disc_label(disc):
     return f"{disc['artist'].strip()} - {disc['album'].strip()}"
 
 
+def write_flac(path, md5_hex, tags):
+    """Write a minimal FLAC (header and STREAMINFO only) with the given audio MD5."""
+    streaminfo = struct.pack(">HH", 4096, 4096) + b"\x00" * 6
+    # 44100 Hz, 2 channels, 16 bits, 0 samples
+    streaminfo += struct.pack(">Q", (44100 << 44) | (1 << 41) | (15 << 36))
+    streaminfo += bytes.fromhex(md5_hex)
+    with open(path, "wb") as file:
+        file.write(b"fLaC" + bytes([0x80, 0, 0, len(streaminfo)]) + streaminfo)
+    audio = FLAC(path)
+    for key, value in tags.items():
+        audio[key] = value
+    audio.save()
+
+
+def write_wav(path, seconds=1):
+    t = np.arange(44100 * seconds) / 44100
+    samples = (0.25 * np.sin(2 * np.pi * 440 * t) * 32767).astype("<i2")
+    frames = np.stack([samples, samples], axis=1).tobytes()
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(frames)
+    return frames
+
+
 @pytest.fixture(params=DISCS, ids=disc_label)
 def disc(request):
     return request.param
@@ -0,0 +1,76 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from mutagen.easyid3 import EasyID3
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3
+
+from conftest import write_flac
+from cover_art import CoverArt, fetch_cover_art
+from profiles import tag_flac, tag_mp3
+
+IMAGE = b"\xff\xd8\xff\xe0 not really a jpeg \xff\xd9"
+
+
+@pytest.fixture
+def cover_server():
+    """Local Cover Art Archive stand-in that serves IMAGE for release 'abc'."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path == "/release/abc/front-500":
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.end_headers()
+                self.wfile.write(IMAGE)
+            else:
+                self.send_error(404)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+
+
+def test_fetch_is_cached_by_release(cover_server, tmp_path):
+    base_url, requests = cover_server
+    cache_dir = str(tmp_path / "covers")
+    assert fetch_cover_art("abc", base_url, cache_dir) == IMAGE
+    assert fetch_cover_art("abc", base_url, cache_dir) == IMAGE
+    assert requests == ["/release/abc/front-500"]
+
+
+def test_release_without_cover(cover_server, tmp_path):
+    base_url, _ = cover_server
+    assert fetch_cover_art("missing", base_url, str(tmp_path)) is None
+
+
+def test_cover_embedded_from_shared_buffer(tmp_path):
+    cover = CoverArt(IMAGE)
+    flac_files = [str(tmp_path / f"{index}.flac") for index in range(2)]
+    for flac_file in flac_files:
+        write_flac(flac_file, "0" * 32, {})
+        tag_flac(flac_file, {"title": "Test"}, cover)
+        tag_flac(flac_file, {"replaygain_album_gain": "1.00 dB"})
+    assert cover.picture.data is IMAGE
+    for flac_file in flac_files:
+        pictures = FLAC(flac_file).pictures
+        assert len(pictures) == 1
+        assert pictures[0].data == IMAGE
+        assert pictures[0].type == 3
+
+
+def test_cover_in_mp3(tmp_path):
+    mp3_file = str(tmp_path / "01.mp3")
+    with open(mp3_file, "wb") as file:
+        file.write(b"\xff\xfb" + bytes(400))
+    tag_mp3(mp3_file, {"title": "Test"}, CoverArt(IMAGE))
+    assert EasyID3(mp3_file)["title"] == ["Test"]
+    assert ID3(mp3_file).getall("APIC")[0].data == IMAGE
@@ -4,7 +4,8 @@ import pytest
 from mutagen.flac import FLAC
 
 from conftest import DISCS
-from encode import encode_track, clean_genre, suggest_genre, build_track_metadata
+from encode import encode_track, clean_genre, suggest_genre, build_track_metadata, format_cdtoc
+from replaygain import AlbumGain
 from rip_cd import generate_filenames
 
 
@@ -94,6 +95,18 @@ def test_single_artist_metadata():
     assert metadata["title"] == "Trip Like I Do"
 
 
+def test_disc_ids_in_metadata():
+    disc = disc_by_artist("The Crystal Method")
+    metadata = build_track_metadata(disc, 0, "Electronic")
+    assert metadata["freedb_id"] == disc["freedb_id"]
+    assert metadata["musicbrainz_discid"] == disc["musicbrainz_id"]
+    assert metadata["cdtoc"] == ""  # no total_sectors in test data
+
+
+def test_format_cdtoc():
+    assert format_cdtoc([150, 10153, 31344], 52991) == "3+96+27A9+7A70+CEFF"
+
+
 # --- Encoding ---
 
 def test_encode_single_track(sample_wav, tmp_path):
@@ -126,6 +139,20 @@ def test_empty_fields_not_tagged(sample_wav, tmp_path):
     assert "genre" not in audio, "Empty genre should not be written as a tag"
 
 
+def test_replaygain_tags(sample_wav, tmp_path):
+    """Track gain is written by encode_track, album gain once the album is done."""
+    album_gain = AlbumGain()
+    flac_files = [str(tmp_path / f"{index}.flac") for index in range(2)]
+    for flac_file in flac_files:
+        encode_track(sample_wav, flac_file, {"title": "Test Track"}, album_gain)
+        assert "replaygain_track_gain" in FLAC(flac_file)
+    album_gain.write_tags()
+    for flac_file in flac_files:
+        audio = FLAC(flac_file)
+        assert audio["replaygain_album_gain"][0].endswith(" dB")
+        assert float(audio["replaygain_album_peak"][0]) <= 1.0
+
+
 def test_encode_full_album(sample_wav, tmp_path):
     """Encode an entire album using Track 1.wav for every track."""
     disc = disc_by_artist("The Crystal Method")
@@ -66,3 +66,12 @@ def test_title_case(disc):
             first_alpha = next((ch for ch in word if ch.isalpha()), None)
             if first_alpha:
                 assert first_alpha == first_alpha.upper(), f"Lowercase word '{word}' in track: {track}"
+
+
+def test_profile_extension(disc):
+    _, flac_tracks = generate_filenames(disc)
+    folder, opus_tracks = generate_filenames(disc, "opus")
+    assert folder == generate_filenames(disc)[0]
+    for flac_track, opus_track in zip(flac_tracks, opus_tracks):
+        assert opus_track == flac_track[:-len("flac")] + "opus"
+
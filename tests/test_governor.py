@@ -0,0 +1,76 @@
+import threading
+import time
+
+from conftest import write_wav
+from encode import encode_track, PCM_CHUNK_FRAMES
+from governor import Budget, ResourceGovernor
+from profiles import PROFILES, Profile
+
+
+def test_budget_blocks_until_released():
+    budget = Budget(100)
+    budget.acquire(60)
+    acquired = threading.Event()
+
+    def producer():
+        budget.acquire(60)
+        acquired.set()
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    assert not acquired.wait(0.1)
+    budget.release(60)
+    assert acquired.wait(1)
+    thread.join()
+    summary = budget.summary()
+    assert summary["in_use"] == 60
+    assert summary["high_water"] == 60
+    assert summary["waits"] == 1
+    assert summary["blocked_seconds"] >= 0.1
+
+
+def test_oversized_request_passes_when_idle():
+    budget = Budget(10)
+    with budget.hold(50):
+        assert budget.in_use == 50
+    assert budget.in_use == 0
+    assert budget.high_water == 50
+
+
+def test_uncapped_budget_is_a_gauge():
+    budget = Budget()
+    for _ in range(3):
+        budget.acquire()
+    budget.release()
+    assert budget.summary()["in_use"] == 2
+    assert budget.summary()["high_water"] == 3
+    assert budget.summary()["waits"] == 0
+
+
+def test_encoders_and_memory_capped(tmp_path, monkeypatch):
+    slow = Profile(
+        "flac", "flac",
+        lambda output_file, channels, bits, sample_rate, input_size: ["sh", "-c", 'cat > "$0"; sleep 0.1', output_file],
+        lambda output_file, tags, cover=None: None)
+    monkeypatch.setitem(PROFILES, "flac", slow)
+    write_wav(tmp_path / "track.wav", seconds=3)
+    chunk_bytes = PCM_CHUNK_FRAMES * 4
+    governor = ResourceGovernor(max_memory_bytes=chunk_bytes, max_encoders=2)
+
+    workers = [
+        threading.Thread(target=encode_track, args=(
+            str(tmp_path / "track.wav"), str(tmp_path / f"{index}.flac"), {}),
+            kwargs={"governor": governor})
+        for index in range(4)]
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert time.monotonic() - start >= 0.2  # two rounds of two encoders
+    summary = governor.summary()
+    assert summary["encoders"]["high_water"] == 2
+    assert summary["encoders"]["waits"] >= 2
+    assert summary["memory_bytes"]["high_water"] == chunk_bytes
+    assert summary["memory_bytes"]["in_use"] == 0
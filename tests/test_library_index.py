@@ -0,0 +1,64 @@
+import hashlib
+import os
+import wave
+
+import library_index
+from conftest import write_flac
+from library_index import update_index, find_disc, wav_md5, INDEX_NAME
+
+
+def make_library(root, albums):
+    for folder, (disc_id, num_tracks) in albums.items():
+        (root / folder).mkdir(parents=True)
+        for track in range(1, num_tracks + 1):
+            write_flac(str(root / folder / f"{track:02d}.flac"), f"{track:032x}", {
+                "tracknumber": str(track),
+                "freedb_id": disc_id,
+                "musicbrainz_discid": f"mb-{disc_id}"})
+
+
+def test_find_owned_disc(tmp_path):
+    make_library(tmp_path, {"A - One": ("aaaa0001", 3), "B - Two": ("bbbb0002", 2)})
+    index = update_index(str(tmp_path))
+    assert len(index) == 5
+    assert find_disc(index, "bbbb0002", "mb-bbbb0002") == {
+        "B - Two": {"1": f"{1:032x}", "2": f"{2:032x}"}}
+    assert find_disc(index, "bbbb0002", None) == find_disc(index, None, "mb-bbbb0002")
+    assert find_disc(index, "cccc0003", "mb-cccc0003") == {}
+
+
+def test_index_is_incremental(tmp_path, monkeypatch):
+    make_library(tmp_path, {"A - One": ("aaaa0001", 3)})
+    update_index(str(tmp_path))
+    assert os.path.exists(tmp_path / INDEX_NAME)
+
+    read = []
+    original = library_index.read_flac_entry
+    monkeypatch.setattr(library_index, "read_flac_entry",
+                        lambda path: read.append(path) or original(path))
+    make_library(tmp_path, {"B - Two": ("bbbb0002", 1)})
+    os.remove(tmp_path / "A - One" / "03.flac")
+    index = update_index(str(tmp_path))
+    assert read == [str(tmp_path / "B - Two" / "01.flac")]
+    assert sorted(index) == [
+        os.path.join("A - One", "01.flac"),
+        os.path.join("A - One", "02.flac"),
+        os.path.join("B - Two", "01.flac")]
+
+
+def test_index_reads_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.setattr(library_index, "PARALLEL_THRESHOLD", 4)
+    make_library(tmp_path, {"A - One": ("aaaa0001", 6)})
+    index = update_index(str(tmp_path), workers=2)
+    assert find_disc(index, "aaaa0001")["A - One"]["6"] == f"{6:032x}"
+
+
+def test_wav_md5_matches_pcm(tmp_path):
+    wav_file = str(tmp_path / "track.wav")
+    frames = bytes(range(256)) * 16
+    with wave.open(wav_file, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(frames)
+    assert wav_md5(wav_file) == hashlib.md5(frames).hexdigest()
@@ -0,0 +1,171 @@
+import struct
+import subprocess
+import wave
+
+import pytest
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3
+
+import numpy as np
+
+from conftest import write_wav
+from encode import encode_track
+import profiles
+from profiles import PROFILES, Profile, flac_command, tag_mp3, missing_encoders, r128_tags
+from replaygain import AlbumGain
+
+
+def stub_profile(name, tagged):
+    """Profile whose 'encoder' copies raw PCM to the output file and whose tagger records tags."""
+    return Profile(
+        name, name,
+        lambda output_file, channels, bits, sample_rate, input_size: ["sh", "-c", 'cat > "$0"', output_file],
+        lambda output_file, tags, cover=None: tagged.setdefault(output_file, []).append(tags))
+
+
+def test_fan_out_reads_once_and_tags_every_output(tmp_path, monkeypatch):
+    tagged = {}
+    monkeypatch.setitem(PROFILES, "flac", stub_profile("flac", tagged))
+    frames = write_wav(tmp_path / "track.wav")
+    flac_file = str(tmp_path / "01.flac")
+    derivatives = [(stub_profile(name, tagged), str(tmp_path / f"01.{name}"))
+                   for name in ("opus", "mp3")]
+    album_gain = AlbumGain()
+
+    encode_track(str(tmp_path / "track.wav"), flac_file, {"title": "Test"}, album_gain, derivatives)
+
+    outputs = [flac_file] + [output_file for _, output_file in derivatives]
+    for output_file in outputs:
+        with open(output_file, "rb") as file:
+            assert file.read() == frames
+        tags = tagged[output_file][0]
+        assert tags["title"] == "Test"
+        assert tags["replaygain_track_gain"] == tagged[flac_file][0]["replaygain_track_gain"]
+
+    album_gain.write_tags()
+    for output_file in outputs:
+        assert "replaygain_album_gain" in tagged[output_file][1]
+
+
+def test_stream_length_passed_to_flac(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setitem(PROFILES, "flac", Profile(
+        "flac", "flac",
+        lambda *args: commands.append(flac_command(*args)) or ["sh", "-c", 'cat > "$0"', args[0]],
+        lambda *args: None))
+    frames = write_wav(tmp_path / "track.wav")
+    encode_track(str(tmp_path / "track.wav"), str(tmp_path / "01.flac"), {})
+    assert f"--input-size={len(frames)}" in commands[0]
+
+
+def test_chatty_encoder_does_not_block(tmp_path, monkeypatch):
+    monkeypatch.setitem(PROFILES, "flac", Profile(
+        "flac", "flac",
+        lambda output_file, *args: [
+            "sh", "-c", 'head -c 200000 /dev/zero >&2; cat > "$0"', output_file],
+        lambda *args: None))
+    frames = write_wav(tmp_path / "track.wav", seconds=3)
+    encode_track(str(tmp_path / "track.wav"), str(tmp_path / "01.flac"), {})
+    assert (tmp_path / "01.flac").read_bytes() == frames
+
+
+def test_failing_encoder_raises(tmp_path, monkeypatch):
+    monkeypatch.setitem(PROFILES, "flac", stub_profile("flac", {}))
+    write_wav(tmp_path / "track.wav")
+    broken = Profile("broken", "x", lambda *args: ["sh", "-c", "exit 3"], lambda *args: None)
+    with pytest.raises(subprocess.CalledProcessError):
+        encode_track(str(tmp_path / "track.wav"), str(tmp_path / "01.flac"), {},
+                     derivatives=[(broken, str(tmp_path / "01.x"))])
+
+
+def test_tag_mp3(tmp_path):
+    mp3_file = str(tmp_path / "01.mp3")
+    with open(mp3_file, "wb") as file:
+        file.write(b"\xff\xfb" + bytes(400))
+    tag_mp3(mp3_file, {
+        "title": "Test", "tracknumber": "3", "totaltracks": "10",
+        "cdtoc": "3+96+27A9+7A70+CEFF", "genre": ""})
+    audio = EasyID3(mp3_file)
+    assert audio["title"] == ["Test"]
+    assert audio["tracknumber"] == ["3/10"]
+    assert audio["cdtoc"] == ["3+96+27A9+7A70+CEFF"]
+    assert "genre" not in audio
+
+
+def test_unsupported_sample_width_rejected_before_encoding(tmp_path, monkeypatch):
+    monkeypatch.setitem(PROFILES, "flac", stub_profile("flac", {}))
+    with wave.open(str(tmp_path / "track.wav"), "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(1)
+        wav.setframerate(44100)
+        wav.writeframes(bytes(4410))
+    with pytest.raises(ValueError, match="8-bit"):
+        encode_track(str(tmp_path / "track.wav"), str(tmp_path / "01.flac"), {})
+    assert not (tmp_path / "01.flac").exists()
+
+
+def test_extensible_24_bit_wav(tmp_path, monkeypatch):
+    tagged = {}
+    monkeypatch.setitem(PROFILES, "flac", stub_profile("flac", tagged))
+    samples = (0.25 * np.sin(2 * np.pi * 440 * np.arange(44100) / 44100) * (1 << 23)).astype("<i4")
+    frames = np.repeat(samples.view(np.uint8).reshape(-1, 4)[:, :3], 2, axis=0).tobytes()
+    pcm_guid = struct.pack("<H", 1) + bytes.fromhex("000000001000800000aa00389b71")
+    fmt = struct.pack("<HHIIHHHHI", 0xFFFE, 2, 44100, 44100 * 6, 6, 24, 22, 24, 3) + pcm_guid
+    chunks = (b"fmt " + struct.pack("<I", len(fmt)) + fmt
+              + b"LIST" + struct.pack("<I", 3) + b"abc\x00"  # odd-sized chunk plus pad byte
+              + b"data" + struct.pack("<I", len(frames)) + frames)
+    (tmp_path / "track.wav").write_bytes(
+        b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks)
+
+    encode_track(str(tmp_path / "track.wav"), str(tmp_path / "01.flac"), {})
+    assert (tmp_path / "01.flac").read_bytes() == frames
+    peak = float(tagged[str(tmp_path / "01.flac")][0]["replaygain_track_peak"])
+    assert peak == pytest.approx(0.25, abs=1e-4)
+
+
+def test_missing_encoder_cleans_up_started_encoders(tmp_path, monkeypatch):
+    monkeypatch.setitem(PROFILES, "flac", stub_profile("flac", {}))
+    write_wav(tmp_path / "track.wav")
+    missing = Profile("missing", "x", lambda *args: ["no-such-encoder-binary"], lambda *args: None)
+    with pytest.raises(FileNotFoundError):
+        encode_track(str(tmp_path / "track.wav"), str(tmp_path / "01.flac"), {},
+                     derivatives=[(missing, str(tmp_path / "01.x"))])
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["track.wav"]
+
+
+def test_error_while_feeding_kills_encoders(tmp_path, monkeypatch):
+    monkeypatch.setitem(PROFILES, "flac", stub_profile("flac", {}))
+    write_wav(tmp_path / "track.wav")
+
+    def fail(self, pcm):
+        raise RuntimeError("analysis failed")
+
+    monkeypatch.setattr("replaygain.TrackAnalyzer.add", fail)
+    with pytest.raises(RuntimeError):
+        encode_track(str(tmp_path / "track.wav"), str(tmp_path / "01.flac"), {})
+    assert not (tmp_path / "01.flac").exists()
+
+
+def test_missing_encoders(monkeypatch):
+    monkeypatch.setattr(profiles.shutil, "which", lambda binary: None if binary == "lame" else binary)
+    assert missing_encoders(["opus", "mp3"]) == ["lame"]
+    assert missing_encoders() == []
+
+
+def test_mp3_replaygain_as_txxx(tmp_path):
+    mp3_file = str(tmp_path / "01.mp3")
+    with open(mp3_file, "wb") as file:
+        file.write(b"\xff\xfb" + bytes(400))
+    tag_mp3(mp3_file, {"replaygain_track_gain": "1.99 dB", "replaygain_album_peak": "0.500000"})
+    frames = ID3(mp3_file)
+    assert frames["TXXX:REPLAYGAIN_TRACK_GAIN"].text == ["1.99 dB"]
+    assert frames["TXXX:REPLAYGAIN_ALBUM_PEAK"].text == ["0.500000"]
+    assert not frames.getall("RVA2")
+
+
+def test_opus_gain_as_r128():
+    tags = r128_tags({
+        "title": "Test",
+        "replaygain_track_gain": "1.99 dB", "replaygain_track_peak": "0.500000",
+        "replaygain_album_gain": "5.00 dB"})
+    assert tags == {"title": "Test", "r128_track_gain": "-771", "r128_album_gain": "0"}
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+import pytest
+from mutagen.flac import FLAC
+
+from conftest import write_flac
+from profiles import PROFILES
+from replaygain import TrackAnalyzer, AlbumGain, gated_loudness
+
+
+def sine_pcm(frequency, amplitude, seconds=5, sample_rate=44100):
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    samples = (amplitude * np.sin(2 * np.pi * frequency * t) * 32767).astype("<i2")
+    return np.stack([samples, samples], axis=1).tobytes()
+
+
+def analyze(pcm, chunk_size=12345 * 4):
+    analyzer = TrackAnalyzer(44100, 2)
+    for start in range(0, len(pcm), chunk_size):
+        analyzer.add(pcm[start:start + chunk_size])
+    return analyzer
+
+
+def test_1khz_sine_loudness():
+    """A -20 dBFS 1 kHz stereo sine measures about -20 LUFS (BS.1770)."""
+    analyzer = analyze(sine_pcm(997, 0.1))
+    assert gated_loudness(analyzer.block_powers()) == pytest.approx(-20.0, abs=0.1)
+    assert analyzer.peak == pytest.approx(0.1, abs=0.001)
+    assert analyzer.tags()["replaygain_track_gain"] == "1.99 dB"
+
+
+def test_chunking_does_not_change_result():
+    pcm = sine_pcm(440, 0.3, seconds=3)
+    assert analyze(pcm, 4 * 997).tags() == analyze(pcm).tags()
+
+
+def test_24_bit_matches_16_bit():
+    t = np.arange(44100 * 3) / 44100
+    samples = (0.3 * np.sin(2 * np.pi * 997 * t) * (2 ** 23 - 1)).astype("<i4")
+    frames = np.stack([samples, samples], axis=1).astype("<i4").tobytes()
+    pcm_24 = b"".join(frames[i:i + 3] for i in range(0, len(frames), 4))
+    analyzer = TrackAnalyzer(44100, 2, sample_width=3)
+    analyzer.add(pcm_24)
+    expected = analyze(sine_pcm(997, 0.3, seconds=3)).tags()
+    assert analyzer.tags()["replaygain_track_gain"] == expected["replaygain_track_gain"]
+    assert analyzer.peak == pytest.approx(0.3, abs=1e-5)
+
+
+def test_unsupported_sample_width():
+    with pytest.raises(ValueError, match="8-bit"):
+        TrackAnalyzer(44100, 2, sample_width=1)
+
+
+def test_silence_gets_zero_gain():
+    analyzer = analyze(bytes(44100 * 4))
+    assert analyzer.tags() == {
+        "replaygain_track_gain": "0.00 dB",
+        "replaygain_track_peak": "0.000000"}
+
+
+def test_album_gain_from_parallel_tracks(tmp_path):
+    album_gain = AlbumGain()
+    files = []
+    amplitudes = [0.05, 0.1, 0.2, 0.4]
+
+    def encode(index):
+        flac_file = str(tmp_path / f"{index:02d}.flac")
+        write_flac(flac_file, "0" * 32, {"tracknumber": str(index)})
+        album_gain.add_track(analyze(sine_pcm(997, amplitudes[index], seconds=2)),
+                             [(PROFILES["flac"], flac_file)])
+        files.append(flac_file)
+
+    workers = [threading.Thread(target=encode, args=(index,)) for index in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    album_gain.write_tags()
+
+    tags = album_gain.tags()
+    assert float(tags["replaygain_album_peak"]) == pytest.approx(0.4, abs=0.001)
+    for flac_file in files:
+        audio = FLAC(flac_file)
+        assert audio["replaygain_album_gain"] == [tags["replaygain_album_gain"]]
@@ -0,0 +1,59 @@
+import subprocess
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+import rip_cd
+from governor import ResourceGovernor
+from rip_cd import CoverFetch, check_encode_jobs, encode_queued_track
+
+
+def test_failed_encode_stops_queued_jobs():
+    failed, queued = Future(), Future()
+    failed.set_exception(subprocess.CalledProcessError(1, "flac"))
+    with pytest.raises(subprocess.CalledProcessError):
+        check_encode_jobs([failed, queued])
+    assert queued.cancelled()
+
+
+def test_spooled_wav_removed_when_encode_fails(tmp_path, monkeypatch):
+    def fail(*args):
+        raise subprocess.CalledProcessError(1, "flac")
+    monkeypatch.setattr(rip_cd, "encode_track", fail)
+    wav_path = tmp_path / "track01.wav"
+    wav_path.write_bytes(b"x" * 100)
+    governor = ResourceGovernor()
+    governor.queued_tracks.acquire()
+    governor.spool.acquire(100)
+    cover = Future()
+    cover.set_result(None)
+    with pytest.raises(subprocess.CalledProcessError):
+        encode_queued_track(governor, str(wav_path), str(tmp_path / "01.flac"), {}, None, (),
+                            cover, spool_bytes=100)
+    assert not wav_path.exists()
+    assert governor.spool.in_use == 0
+
+
+def test_stalled_cover_fetch_resolved_once_for_every_track(monkeypatch):
+    release = threading.Event()
+    fetched = threading.Event()
+
+    def fetch(musicbrainz_id, release_id):
+        release.wait()
+        fetched.set()
+        return "cover"
+
+    monkeypatch.setattr(rip_cd, "fetch_disc_cover", fetch)
+    monkeypatch.setattr(rip_cd, "COVER_WAIT_SECONDS", 0.05)
+    cover_fetch = CoverFetch("disc-id")
+    assert cover_fetch.result() is None
+    release.set()
+    fetched.wait(1)
+    assert cover_fetch.result() is None
+
+
+def test_cover_fetch_shared_by_every_track(monkeypatch):
+    monkeypatch.setattr(rip_cd, "fetch_disc_cover", lambda musicbrainz_id, release_id: "cover")
+    cover_fetch = CoverFetch("disc-id")
+    assert [cover_fetch.result() for _ in range(3)] == ["cover"] * 3
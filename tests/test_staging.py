@@ -0,0 +1,77 @@
+import os
+import threading
+
+from staging import Mover, move_album, directory_size
+
+
+def make_album(path, files):
+    path.mkdir(parents=True)
+    for name, data in files.items():
+        (path / name).write_bytes(data)
+
+
+def test_move_album_to_new_folder(tmp_path):
+    staged = tmp_path / "staging" / "Artist - Album"
+    make_album(staged, {"01.flac": b"a" * 1000, "02.flac": b"b" * 2000})
+    final = tmp_path / "library" / "Artist - Album"
+    move_album(str(staged), str(final))
+    assert sorted(os.listdir(final)) == ["01.flac", "02.flac"]
+    assert (final / "02.flac").read_bytes() == b"b" * 2000
+    assert not staged.exists()
+    assert os.listdir(tmp_path / "library") == ["Artist - Album"]
+
+
+def test_move_album_replaces_existing_folder(tmp_path):
+    staged = tmp_path / "staging" / "Artist - Album"
+    make_album(staged, {"01 - New Name.flac": b"new"})
+    final = tmp_path / "library" / "Artist - Album"
+    make_album(final, {"01 - Old Name.flac": b"old"})
+    move_album(str(staged), str(final))
+    assert os.listdir(final) == ["01 - New Name.flac"]
+    assert (final / "01 - New Name.flac").read_bytes() == b"new"
+    assert os.listdir(tmp_path / "library") == ["Artist - Album"]
+
+
+def test_mover_moves_in_background(tmp_path):
+    library = tmp_path / "library"
+    mover = Mover(str(tmp_path / "staging"), max_bytes=1)
+    for folder in ("A - One", "B - Two"):
+        album_dir = mover.album_dir(folder)
+        with open(os.path.join(album_dir, "01.flac"), "wb") as file:
+            file.write(b"x" * 100)
+        mover.submit(folder, str(library))
+        mover.wait_for_space()
+    mover.close()
+    assert not mover.errors
+    assert sorted(os.listdir(library)) == ["A - One", "B - Two"]
+    assert directory_size(str(tmp_path / "staging")) == 0
+
+
+def test_cap_applies_before_submit(tmp_path):
+    """The album being staged is held to the cap while its temp files drain."""
+    mover = Mover(str(tmp_path / "staging"), max_bytes=150)
+    album_dir = mover.album_dir("A - One")
+    wav_file = os.path.join(album_dir, "track01.wav")
+    with open(wav_file, "wb") as file:
+        file.write(b"x" * 100)
+    done = threading.Event()
+
+    def producer():
+        mover.wait_for_space(100, draining=lambda: os.path.exists(wav_file))
+        done.set()
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    assert not done.wait(0.3)
+    os.remove(wav_file)
+    assert done.wait(3)
+    thread.join()
+    mover.close()
+
+
+def test_oversized_request_passes_when_nothing_can_free_space(tmp_path):
+    mover = Mover(str(tmp_path / "staging"), max_bytes=50)
+    with open(os.path.join(mover.album_dir("A - One"), "01.flac"), "wb") as file:
+        file.write(b"x" * 100)
+    mover.wait_for_space(100)
+    mover.close()
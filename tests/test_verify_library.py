@@ -0,0 +1,75 @@
+import os
+import time
+
+import pytest
+
+import verify_library
+from library_index import load_index
+from verify_library import Throttle, verify_library as verify
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    """Library of fake FLACs; the stub verifier fails any file containing 'BAD'."""
+    monkeypatch.setattr(verify_library, "VERIFY_COMMAND", ["sh", "-c", '! grep -q BAD "$0"'])
+    for folder, name, content in [
+            ("A - One", "01.flac", "GOOD"),
+            ("A - One", "02.flac", "BAD"),
+            ("B - Two", "01.flac", "GOOD")]:
+        (tmp_path / folder).mkdir(exist_ok=True)
+        (tmp_path / folder / name).write_text(content)
+    return tmp_path
+
+
+def test_reports_failures_and_stats(library):
+    report = verify(str(library), workers=2)
+    assert [failure["path"] for failure in report["failures"]] == [
+        os.path.join("A - One", "02.flac")]
+    stats = report["stats"]
+    assert stats["files_checked"] == 3
+    assert stats["files_skipped"] == 0
+    assert stats["bytes_checked"] == 11
+
+
+def test_only_new_or_changed_files_rechecked(library):
+    verify(str(library))
+    report = verify(str(library))
+    assert report["stats"]["files_checked"] == 1  # the failed file is always re-checked
+    assert report["stats"]["files_skipped"] == 2
+    assert len(report["failures"]) == 1
+
+    (library / "A - One" / "02.flac").write_text("GOOD NOW")
+    (library / "C - Three").mkdir()
+    (library / "C - Three" / "01.flac").write_text("GOOD")
+    report = verify(str(library))
+    assert report["stats"]["files_checked"] == 2
+    assert report["failures"] == []
+
+
+def test_stale_results_rechecked(library):
+    verify(str(library))
+    report = verify(str(library), reverify_days=0)
+    assert report["stats"]["files_checked"] == 3
+
+
+def test_launch_failures_not_recorded(library, monkeypatch):
+    monkeypatch.setattr(verify_library, "VERIFY_COMMAND", ["sh", "-c", "exit 127"])
+    report = verify(str(library))
+    assert report["stats"]["files_checked"] == 0
+    assert report["stats"]["files_not_checked"] == 3
+    assert report["failures"] == []
+    assert load_index(str(library / verify_library.VERIFY_INDEX_NAME)) == {}
+
+
+def test_missing_verify_command(library, monkeypatch):
+    monkeypatch.setattr(verify_library, "VERIFY_COMMAND", ["no-such-flac", "--test"])
+    with pytest.raises(FileNotFoundError):
+        verify(str(library))
+
+
+def test_throttle_limits_rate():
+    throttle = Throttle(10000)
+    start = time.monotonic()
+    for _ in range(3):
+        throttle.wait(1000)
+    assert time.monotonic() - start >= 0.25
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from library_index import find_flac_files, load_index, save_index
+
+
+VERIFY_INDEX_NAME = ".cdrip_verify.json"
+VERIFY_COMMAND = ["flac", "--test", "--silent"]
+SAVE_EVERY = 100
+LAUNCH_FAILURES = (126, 127)  # exit status when nice/ionice can't run the command
+
+
+def idle_priority():
+    """Command prefix that runs a verify process at idle IO and CPU priority."""
+    prefix = []
+    if shutil.which("ionice"):
+        prefix += ["ionice", "-c", "3"]
+    if shutil.which("nice"):
+        prefix += ["nice", "-n", "19"]
+    return prefix
+
+
+class Throttle:
+    """Limits the combined read rate of all workers to max_bytes_per_second."""
+
+    def __init__(self, max_bytes_per_second=None):
+        self.max_bytes_per_second = max_bytes_per_second
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._bytes = 0
+
+    def wait(self, size):
+        if not self.max_bytes_per_second:
+            return
+        with self._lock:
+            self._bytes += size
+            ready_at = self._start + self._bytes / self.max_bytes_per_second
+        delay = ready_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def verify_file(path, throttle, size):
+    """Decode a FLAC and check it against its STREAMINFO MD5. Returns (ok, error).
+
+    ok is None if the verify command itself couldn't be run.
+    """
+    throttle.wait(size)
+    result = subprocess.run(idle_priority() + VERIFY_COMMAND + [path],
+                            capture_output=True, text=True)
+    if result.returncode in LAUNCH_FAILURES:
+        return None, result.stderr.strip() or f"exit status {result.returncode}"
+    if result.returncode:
+        return False, result.stderr.strip() or f"exit status {result.returncode}"
+    return True, ""
+
+
+def files_to_verify(library_dir, index, reverify_days):
+    """Split the library into files needing a check and files whose last check still stands.
+
+    A file is checked if it is new, its size or mtime changed, its last
+    check failed, or its last check is older than reverify_days.
+    """
+    cutoff = time.time() - reverify_days * 86400
+    due, current = [], {}
+    for rel_path, size, mtime in find_flac_files(library_dir):
+        entry = index.get(rel_path)
+        if (entry and entry["ok"] and entry["size"] == size and entry["mtime"] == mtime
+                and entry["verified_at"] >= cutoff):
+            current[rel_path] = entry
+        else:
+            due.append((rel_path, size, mtime))
+    return due, current
+
+
+def verify_library(library_dir, reverify_days=90, workers=None, max_mbps=None, index_path=None):
+    """Verify new, changed and stale FLACs in library_dir in parallel.
+
+    Results are recorded in an index keyed by path, size and mtime so later
+    runs skip files that were verified recently. Each check runs `flac --test`
+    at idle IO priority, and max_mbps caps the combined read rate. Returns a
+    report dict with every known failure and throughput statistics.
+    """
+    if not shutil.which(VERIFY_COMMAND[0]):
+        raise FileNotFoundError(f"{VERIFY_COMMAND[0]} not found on PATH")
+    if index_path is None:
+        index_path = os.path.join(library_dir, VERIFY_INDEX_NAME)
+    due, index = files_to_verify(library_dir, load_index(index_path), reverify_days)
+    skipped = len(index)
+
+    throttle = Throttle(max_mbps * 1024 * 1024 if max_mbps else None)
+    start = time.monotonic()
+    bytes_checked = 0
+    not_checked = 0
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {
+            pool.submit(verify_file, os.path.join(library_dir, rel_path), throttle, size):
+                (rel_path, size, mtime)
+            for rel_path, size, mtime in due}
+        for done, future in enumerate(as_completed(futures), start=1):
+            rel_path, size, mtime = futures[future]
+            ok, error = future.result()
+            if ok is None:
+                print(f"Could not run {VERIFY_COMMAND[0]} on {rel_path}: {error}")
+                not_checked += 1
+                continue
+            index[rel_path] = {
+                "size": size,
+                "mtime": mtime,
+                "verified_at": time.time(),
+                "ok": ok,
+                "error": error}
+            bytes_checked += size
+            if not ok:
+                print(f"FAILED: {rel_path}: {error}")
+            if done % SAVE_EVERY == 0:
+                save_index(index, index_path)
+    save_index(index, index_path)
+    seconds = time.monotonic() - start
+
+    return {
+        "failures": [
+            {"path": rel_path, "error": entry["error"], "verified_at": entry["verified_at"]}
+            for rel_path, entry in sorted(index.items()) if not entry["ok"]],
+        "stats": {
+            "files_checked": len(due) - not_checked,
+            "files_not_checked": not_checked,
+            "files_skipped": skipped,
+            "bytes_checked": bytes_checked,
+            "seconds": round(seconds, 3),
+            "files_per_second": round((len(due) - not_checked) / seconds, 2) if seconds else 0.0,
+            "mb_per_second": round(bytes_checked / 1024 / 1024 / seconds, 2) if seconds else 0.0}}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Check FLACs in a library for corruption, re-checking only what's due.")
+    parser.add_argument("library_dir", help="root of the music library")
+    parser.add_argument(
+        "--reverify-days", type=float, default=90,
+        help="re-check files last verified more than this many days ago (default: 90)")
+    parser.add_argument(
+        "--workers", type=int,
+        help="flac processes to run at once (default: one per CPU)")
+    parser.add_argument(
+        "--max-mbps", type=float,
+        help="cap the combined read rate in MB/s, to leave IO for active rips")
+    parser.add_argument(
+        "--report",
+        help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+    try:
+        report = verify_library(args.library_dir, args.reverify_days, args.workers, args.max_mbps)
+    except FileNotFoundError as e:
+        parser.exit(2, f"Error: {e}\n")
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(report, file, indent=2)
+            file.write("\n")
+    else:
+        print(json.dumps(report, indent=2))
+    raise SystemExit(1 if report["failures"] else 0)